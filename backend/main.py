@@ -3,13 +3,20 @@ FastAPI Backend for CredibleMe
 Handles credential verification requests and serves web pages
 """
 from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from pydantic import BaseModel
 from typing import Optional
-from gemini_client import GeminiClient
+from gemini_client import GeminiClient, build_cache_key
 import os
+import logging
+import logging.handlers
+import queue
+import re
+import orjson
+import redis.asyncio as redis
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -27,19 +34,97 @@ app = FastAPI(
 BASE_DIR = Path(__file__).resolve().parent
 TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
+JINJA_CACHE_DIR = BASE_DIR / ".jinja_cache"
 
-# Create directories if they don't exist
-TEMPLATES_DIR.mkdir(exist_ok=True)
-STATIC_DIR.mkdir(exist_ok=True)
+# In production, compile templates once: no mtime checks per render. Other
+# environments keep auto-reload so template edits show up without a restart.
+IS_PRODUCTION = os.getenv("ENV") == "production"
 
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+# Bytecode is cached on disk either way
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader(str(TEMPLATES_DIR)),
+        autoescape=True,
+        auto_reload=not IS_PRODUCTION,
+        bytecode_cache=FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
+    )
+)
+# Directories are created on startup, before the first request is served
+app.mount(
+    "/static",
+    StaticFiles(directory=str(STATIC_DIR), check_dir=False),
+    name="static"
+)
+
+# Cheap format checks run before spending a Gemini call
+_GH_RE = re.compile(r"^[A-Za-z0-9-]{1,39}$")
+_LI_RE = re.compile(r"^https?://(www\.)?linkedin\.com/in/[\w-]+/?$", re.IGNORECASE)
+
+
+def validate_profiles(github_username: str, linkedin_url: str) -> Optional[str]:
+    """Return an error message if a profile identifier is malformed"""
+    if not _GH_RE.match(github_username.strip().lstrip("@")):
+        return "Invalid GitHub username"
+    if not _LI_RE.match(linkedin_url.strip()):
+        return "Invalid LinkedIn URL"
+    return None
+
+
+# Log records are queued on the hot path and written by a listener thread
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(
+    logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+)
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+
+# Gemini and Redis clients are created in startup(), not at import: with
+# --workers, uvicorn spawns children that re-import this module, and only the
+# app's own startup/shutdown hooks would ever release what import created.
+gemini_client: Optional[GeminiClient] = None
+
+# Session storage shared across workers; entries expire after SESSION_TTL_SECONDS
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost")
+SESSION_TTL_SECONDS = 3600
+session_store: Optional[redis.Redis] = None
+
+
+async def save_session(session_id: str, result: dict) -> None:
+    """Store a verification result under its session ID"""
+    await session_store.setex(
+        f"cm:sess:{session_id}", SESSION_TTL_SECONDS, orjson.dumps(result)
+    )
+
+
+async def load_session(session_id: str) -> Optional[dict]:
+    """Fetch a verification result, or None if missing or expired"""
+    raw = await session_store.get(f"cm:sess:{session_id}")
+    return orjson.loads(raw) if raw is not None else None
 
-# Initialize Gemini client
-gemini_client = GeminiClient()
 
-# In-memory storage (session-based, no persistence)
-session_storage = {}
+@app.on_event("startup")
+async def startup():
+    """Set up logging and directories, create clients, start and warm Gemini"""
+    global gemini_client, session_store
+    logging.getLogger().addHandler(log_queue_handler)
+    log_listener.start()
+    for directory in (TEMPLATES_DIR, STATIC_DIR, JINJA_CACHE_DIR):
+        directory.mkdir(exist_ok=True)
+    session_store = redis.Redis.from_url(REDIS_URL)
+    gemini_client = GeminiClient()
+    await gemini_client.start()
+    await gemini_client.warm_up()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop Gemini client tasks, persist caches, close Redis, flush logs"""
+    await gemini_client.close()
+    await session_store.aclose()
+    # Detach before stopping so nothing queues records no thread will drain
+    logging.getLogger().removeHandler(log_queue_handler)
+    log_listener.stop()
 
 
 # Request/Response models
@@ -73,7 +158,8 @@ async def verify_page(request: Request):
 @app.get("/result/{session_id}", response_class=HTMLResponse)
 async def result_page(request: Request, session_id: str):
     """Result display page"""
-    if session_id not in session_storage:
+    result = await load_session(session_id)
+    if result is None:
         return templates.TemplateResponse(
             "error.html",
             {
@@ -82,7 +168,6 @@ async def result_page(request: Request, session_id: str):
             }
         )
     
-    result = session_storage[session_id]
     return templates.TemplateResponse(
         "result.html",
         {
@@ -143,21 +228,32 @@ async def verify_credentials_form(
                 }
             )
         
+        error = validate_profiles(github_username, linkedin_url)
+        if error:
+            return templates.TemplateResponse(
+                "error.html",
+                {
+                    "request": request,
+                    "error": error
+                }
+            )
+        
+        # Hash once: the key indexes the response cache and the session
+        cache_key = build_cache_key(
+            resume_text, github_username, linkedin_url
+        )
+        session_id = cache_key[:8]
+
         # Call Gemini for analysis
-        result = gemini_client.analyze_credentials(
+        result = await gemini_client.analyze_credentials(
             resume_text=resume_text,
             github_username=github_username,
-            linkedin_url=linkedin_url
+            linkedin_url=linkedin_url,
+            cache_key=cache_key
         )
         
-        # Generate session ID (simple hash for demo)
-        import hashlib
-        session_id = hashlib.md5(
-            f"{resume_text}{github_username}{linkedin_url}".encode()
-        ).hexdigest()[:8]
-        
-        # Store in session (in-memory)
-        session_storage[session_id] = result
+        # Store in session (Redis, expires after SESSION_TTL_SECONDS)
+        await save_session(session_id, result)
         
         # Redirect to result page
         return RedirectResponse(url=f"/result/{session_id}", status_code=303)
@@ -203,21 +299,29 @@ async def verify_credentials_api(request: VerifyRequest):
                 detail="LinkedIn URL is required"
             )
         
+        error = validate_profiles(request.github_username, request.linkedin_url)
+        if error:
+            raise HTTPException(
+                status_code=400,
+                detail=error
+            )
+        
+        # Hash once: the key indexes the response cache and the session
+        cache_key = build_cache_key(
+            request.resume_text, request.github_username, request.linkedin_url
+        )
+        session_id = cache_key[:8]
+
         # Call Gemini for analysis
-        result = gemini_client.analyze_credentials(
+        result = await gemini_client.analyze_credentials(
             resume_text=request.resume_text,
             github_username=request.github_username,
-            linkedin_url=request.linkedin_url
+            linkedin_url=request.linkedin_url,
+            cache_key=cache_key
         )
         
-        # Generate session ID (simple hash for demo)
-        import hashlib
-        session_id = hashlib.md5(
-            f"{request.resume_text}{request.github_username}{request.linkedin_url}".encode()
-        ).hexdigest()[:8]
-        
-        # Store in session (in-memory)
-        session_storage[session_id] = result
+        # Store in session (Redis, expires after SESSION_TTL_SECONDS)
+        await save_session(session_id, result)
         
         return VerifyResponse(
             trust_score=result["trust_score"],
@@ -235,6 +339,78 @@ async def verify_credentials_api(request: VerifyRequest):
         )
 
 
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+@app.post("/api/verify/stream")
+async def verify_credentials_stream(request: VerifyRequest):
+    """
+    Verify user credentials using Gemini AI, streaming the analysis (API endpoint)
+    
+    Args:
+        request: VerifyRequest with resume_text, github_username, linkedin_url
+        
+    Returns:
+        text/event-stream of "delta" events carrying raw JSON fragments,
+        followed by one "result" event (VerifyResponse fields) or an
+        "error" event
+    """
+    # Validate input
+    if not request.resume_text.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Resume text is required"
+        )
+    
+    if not request.github_username.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="GitHub username is required"
+        )
+    
+    if not request.linkedin_url.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="LinkedIn URL is required"
+        )
+    
+    error = validate_profiles(request.github_username, request.linkedin_url)
+    if error:
+        raise HTTPException(
+            status_code=400,
+            detail=error
+        )
+    
+    cache_key = build_cache_key(
+        request.resume_text, request.github_username, request.linkedin_url
+    )
+    session_id = cache_key[:8]
+
+    async def events():
+        try:
+            result = None
+            async for item in gemini_client.analyze_credentials_stream(
+                resume_text=request.resume_text,
+                github_username=request.github_username,
+                linkedin_url=request.linkedin_url,
+                cache_key=cache_key
+            ):
+                # Text fragments are forwarded; the final item is the result
+                if isinstance(item, dict):
+                    result = item
+                else:
+                    yield _sse("delta", {"text": item})
+
+            await save_session(session_id, result)
+            yield _sse("result", {**result, "session_id": session_id})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Internal server error: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.get("/api/result/{session_id}")
 async def get_result_api(session_id: str):
     """
@@ -246,13 +422,13 @@ async def get_result_api(session_id: str):
     Returns:
         Stored verification result
     """
-    if session_id not in session_storage:
+    result = await load_session(session_id)
+    if result is None:
         raise HTTPException(
             status_code=404,
             detail="Session not found"
         )
     
-    result = session_storage[session_id]
     return VerifyResponse(
         trust_score=result["trust_score"],
         reasoning=result["reasoning"],
@@ -262,6 +438,16 @@ async def get_result_api(session_id: str):
 
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # libuv event loop and C HTTP parser; Redis-backed sessions make
+    # multiple workers safe
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4"))
+    )
 
@@ -0,0 +1,30 @@
+"""
+Tests for GeminiClient prompt construction
+Use the real cl100k_base tokenizer; skipped when it cannot be loaded offline
+"""
+import pytest
+
+import gemini_client
+from gemini_client import GeminiClient, MAX_RESUME_TOKENS
+
+
+@pytest.fixture(scope="module")
+def client() -> GeminiClient:
+    try:
+        encoding = gemini_client._load_encoding()
+    except RuntimeError:
+        pytest.skip("cl100k_base tokenizer unavailable (offline, empty cache)")
+    return GeminiClient(model=object(), encoding=encoding, use_semantic_cache=False)
+
+
+def test_special_token_text_in_resume_is_allowed(client):
+    resume = "Built tokenizers. <|endoftext|> <|fim_prefix|> Python, Rust."
+    prompt = client._build_analysis_prompt(resume, "octocat", "https://linkedin.com/in/octocat")
+    assert "<|endoftext|>" in prompt
+
+
+def test_resume_is_truncated_by_tokens(client):
+    resume = "engineer " * (MAX_RESUME_TOKENS * 2)
+    prompt = client._build_analysis_prompt(resume, "octocat", "https://linkedin.com/in/octocat")
+    content = prompt.split("RESUME CONTENT:\n", 1)[1].split("\n\nGITHUB USERNAME:", 1)[0]
+    assert len(client._enc.encode(content)) == MAX_RESUME_TOKENS